@@ -1,27 +1,61 @@
 import argparse
+import os
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from datasets import load_dataset
 
 from src.utils.config import RAW_DIR
-from src.schemas.columns import UNIFIED_CODE_COLUMNS
+from src.utils.parquet_io import PARQUET_WRITE_OPTIONS, split_dir
+from src.schemas.columns import UNIFIED_CODE_COLUMNS, UNIFIED_ARROW_SCHEMA as SCHEMA
+
+# rows mapped per parquet row group; bounds peak memory while streaming
+BATCH_SIZE = 8192
+# records per Dataset.map() call in multi-process mode
+MAP_BATCH_SIZE = 1000
 
 
 # ---------- helpers ----------
-def _enforce_unified(df: pd.DataFrame) -> pd.DataFrame:
-    for col in UNIFIED_CODE_COLUMNS.keys():
-        if col not in df.columns:
-            df[col] = ""
-    return df[list(UNIFIED_CODE_COLUMNS.keys())]
+def _strip_strings(tbl: pa.Table) -> pa.Table:
+    # strip strings column-wise and drop literal "None"
+    cols = []
+    for c in tbl.column_names:
+        s = pc.utf8_trim_whitespace(pc.fill_null(tbl[c], ""))
+        cols.append(pc.if_else(pc.equal(s, "None"), "", s))
+    return pa.Table.from_arrays(cols, schema=tbl.schema)
+
+
+class UnifiedBuilder:
+    """Column-wise (SoA) buffer of mapped records, one list per unified column."""
+
+    def __init__(self, split: str):
+        self.split_name = split
+        self.reset()
 
+    def reset(self) -> None:
+        self.source: List[str] = []
+        self.dataset_id: List[str] = []
+        self.title: List[str] = []
+        self.prompt: List[str] = []
+        self.solution: List[str] = []
+        self.language: List[str] = []
+        self.difficulty: List[str] = []
+        self.tags: List[str] = []
+        # constant per split; filled in by to_pydict()
+        self.split: List[str] = []
 
-def _save_parquet(df: pd.DataFrame, out_dir: Path, name: str):
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / f"{name}.parquet"
-    df.to_parquet(out_path, index=False, engine="pyarrow")
-    print(f"✅ saved -> {out_path}")
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def to_pydict(self) -> Dict[str, List[str]]:
+        self.split = [self.split_name] * len(self)
+        return {k: getattr(self, k) for k in UNIFIED_CODE_COLUMNS}
+
+    def to_table(self) -> pa.Table:
+        return _strip_strings(pa.Table.from_pydict(self.to_pydict(), schema=SCHEMA))
 
 
 # ---------- mappers ----------
@@ -35,78 +69,56 @@ def _first(rec: Dict[str, Any], keys) -> str:
             return s
     return ""
 
-def map_leetcode(rec: Dict[str, Any]) -> Dict[str, Any]:
-    def _first(rec, keys):
-        for k in keys:
-            v = rec.get(k)
-            if v is None:
-                continue
-            s = str(v).strip()
-            if s and s.lower() != "none":
-                return s
-        return ""
-
+def map_leetcode(rec: Dict[str, Any], b: UnifiedBuilder) -> None:
     qid = _first(rec, ["question_id", "id"])
     title = _first(rec, ["title", "question_title"]) or (f"leetcode_{qid}" if qid else "leetcode_problem")
 
-    return {
-        "source": "LeetCodeDataset",
-        "dataset_id": qid,
-        "title": title,
-        "prompt": _first(rec, ["content", "translatedContent", "description", "question", "body", "prompt"]),
-        "solution": _first(rec, ["solution", "accepted_answer", "reference_solution"]),
-        "language": "",
-        "difficulty": _first(rec, ["difficulty", "level"]),
-        "tags": ",".join(rec.get("tags", []) or []),
-        "split": ""  # set later
-    }
-
-def map_apps(rec: Dict[str, Any]) -> Dict[str, Any]:
+    b.source.append("LeetCodeDataset")
+    b.dataset_id.append(qid)
+    b.title.append(title)
+    b.prompt.append(_first(rec, ["content", "translatedContent", "description", "question", "body", "prompt"]))
+    b.solution.append(_first(rec, ["solution", "accepted_answer", "reference_solution"]))
+    b.language.append("")
+    b.difficulty.append(_first(rec, ["difficulty", "level"]))
+    b.tags.append(",".join(str(t) for t in rec.get("tags", []) or []))
+
+def map_apps(rec: Dict[str, Any], b: UnifiedBuilder) -> None:
     # codeparrot/apps
     sols = rec.get("solutions")
     if isinstance(sols, list):
         sols = "\n\n---\n\n".join([str(s) for s in sols])
-    return {
-        "source": "APPS",
-        "dataset_id": str(rec.get("problem_id") or rec.get("id") or ""),
-        "title": rec.get("title") or "",
-        "prompt": rec.get("question") or rec.get("prompt") or "",
-        "solution": sols or rec.get("solution") or "",
-        "language": "python",  # APPS is mostly Python
-        "difficulty": str(rec.get("difficulty") or ""),
-        "tags": "",
-        "split": ""  # set later
-    }
-
-
-def map_codeforces(rec: Dict[str, Any]) -> Dict[str, Any]:
+    b.source.append("APPS")
+    b.dataset_id.append(str(rec.get("problem_id") or rec.get("id") or ""))
+    b.title.append(str(rec.get("title") or ""))
+    b.prompt.append(str(rec.get("question") or rec.get("prompt") or ""))
+    b.solution.append(str(sols or rec.get("solution") or ""))
+    b.language.append("python")  # APPS is mostly Python
+    b.difficulty.append(str(rec.get("difficulty") or ""))
+    b.tags.append("")
+
+
+def map_codeforces(rec: Dict[str, Any], b: UnifiedBuilder) -> None:
     # DenCT/codeforces-problems-7k
-    return {
-        "source": "Codeforces",
-        "dataset_id": str(rec.get("id") or rec.get("problem_id") or ""),
-        "title": rec.get("name") or rec.get("title") or "",
-        "prompt": rec.get("statement") or rec.get("prompt") or rec.get("description") or "",
-        "solution": "",
-        "language": "",
-        "difficulty": str(rec.get("rating") or rec.get("difficulty") or ""),
-        "tags": ",".join(rec.get("tags", []) or []),
-        "split": ""  # set later
-    }
-
-
-def map_codesearchnet(rec: Dict[str, Any]) -> Dict[str, Any]:
+    b.source.append("Codeforces")
+    b.dataset_id.append(str(rec.get("id") or rec.get("problem_id") or ""))
+    b.title.append(str(rec.get("name") or rec.get("title") or ""))
+    b.prompt.append(str(rec.get("statement") or rec.get("prompt") or rec.get("description") or ""))
+    b.solution.append("")
+    b.language.append("")
+    b.difficulty.append(str(rec.get("rating") or rec.get("difficulty") or ""))
+    b.tags.append(",".join(str(t) for t in rec.get("tags", []) or []))
+
+
+def map_codesearchnet(rec: Dict[str, Any], b: UnifiedBuilder) -> None:
     # sentence-transformers/codesearchnet or Nan-Do/code-search-net-python
-    return {
-        "source": "CodeSearchNet",
-        "dataset_id": str(rec.get("func_id") or rec.get("id") or ""),
-        "title": rec.get("func_name") or rec.get("path") or "",
-        "prompt": rec.get("docstring") or rec.get("original_string") or "",
-        "solution": rec.get("code") or "",
-        "language": rec.get("language") or rec.get("programming_language") or "",
-        "difficulty": "",
-        "tags": "",
-        "split": ""  # set later
-    }
+    b.source.append("CodeSearchNet")
+    b.dataset_id.append(str(rec.get("func_id") or rec.get("id") or ""))
+    b.title.append(str(rec.get("func_name") or rec.get("path") or ""))
+    b.prompt.append(str(rec.get("docstring") or rec.get("original_string") or ""))
+    b.solution.append(str(rec.get("code") or ""))
+    b.language.append(str(rec.get("language") or rec.get("programming_language") or ""))
+    b.difficulty.append("")
+    b.tags.append("")
 
 
 # ---------- registry ----------
@@ -120,27 +132,67 @@ REGISTRY = {
 }
 
 
-def load_and_map(hf_path: str, mapper, split: str) -> pd.DataFrame:
-    print(f"⏬ loading: {hf_path}  split={split}")
-
+def _map_batch(batch: Dict[str, List[Any]], mapper, split: str) -> Dict[str, List[str]]:
+    # Dataset.map(batched=True) hands us columns; mappers work per record
+    b = UnifiedBuilder(split)
+    keys = list(batch.keys())
+    for vals in zip(*batch.values()):
+        mapper(dict(zip(keys, vals)), b)
+    return b.to_pydict()
+
+
+def _stream_tables(ds, mapper, split: str) -> Iterator[pa.Table]:
+    b = UnifiedBuilder(split)
+    for rec in ds:
+        mapper(rec, b)
+        if len(b) >= BATCH_SIZE:
+            yield b.to_table()
+            b.reset()
+    if len(b):
+        yield b.to_table()
+
+
+def _parallel_tables(ds, mapper, split: str, num_proc: int) -> Iterator[pa.Table]:
+    ds = ds.map(
+        _map_batch,
+        batched=True,
+        batch_size=MAP_BATCH_SIZE,
+        num_proc=num_proc,
+        remove_columns=ds.column_names,
+        fn_kwargs={"mapper": mapper, "split": split},
+    )
+    for tbl in ds.with_format("arrow").iter(batch_size=BATCH_SIZE):
+        yield _strip_strings(tbl.select(SCHEMA.names).cast(SCHEMA))
+
+
+def load_and_map(hf_path: str, mapper, split: str, out_path: Path, num_proc: int = 1) -> int:
     # Some datasets (e.g., codeparrot/apps) need trust_remote_code
     load_kwargs = {}
     if hf_path == "codeparrot/apps":
         load_kwargs["trust_remote_code"] = True
 
-    ds = load_dataset(hf_path, split=split, **load_kwargs)
-    rows: List[Dict[str, Any]] = [mapper(rec) for rec in ds]
-    df = pd.DataFrame(rows)
-    df = _enforce_unified(df)
-
-    # strip strings column-wise (avoid deprecated applymap)
-    obj_cols = df.select_dtypes(include=["object"]).columns
-    for c in obj_cols:
-        s = df[c].astype(str).str.strip()
-        df[c] = s.where(s != "None", "")
-
-    df["split"] = split
-    return df
+    if num_proc > 1:
+        # download the split, then map it in worker processes
+        print(f"⏬ loading: {hf_path}  split={split}  num_proc={num_proc}")
+        ds = load_dataset(hf_path, split=split, **load_kwargs)
+        tables = _parallel_tables(ds, mapper, split, num_proc)
+    else:
+        print(f"⏬ streaming: {hf_path}  split={split}")
+        ds = load_dataset(hf_path, split=split, streaming=True, **load_kwargs)
+        tables = _stream_tables(ds, mapper, split)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # dot-prefixed so dataset discovery never picks up a partial file
+    tmp_path = out_path.with_name(f".{out_path.name}.tmp")
+    n_rows = 0
+    with pq.ParquetWriter(tmp_path, SCHEMA, **PARQUET_WRITE_OPTIONS) as writer:
+        for tbl in tables:
+            writer.write_table(tbl)
+            n_rows += tbl.num_rows
+    tmp_path.replace(out_path)
+
+    print(f"✅ saved -> {out_path}  ({n_rows:,} rows)")
+    return n_rows
 
 
 def main():
@@ -149,19 +201,19 @@ def main():
                     help="Which dataset key to download.")
     ap.add_argument("--split", action="append",
                     help="Optionally override split(s). Can repeat, e.g. --split train --split validation")
+    ap.add_argument("--num-proc", type=int, default=1,
+                    help="Map records in N worker processes (downloads the split instead of streaming it). "
+                         "0 = one per CPU.")
     args = ap.parse_args()
+    num_proc = args.num_proc or os.cpu_count() or 1
 
     hf_path, mapper, default_splits = REGISTRY[args.dataset]
     splits = args.split or default_splits
 
-    all_parts = []
+    # Write each split into its own Hive-style partition (split=<sp>/)
     for sp in splits:
-        df = load_and_map(hf_path, mapper, sp)
-        all_parts.append((sp, df))
-
-    # Save each split separately
-    for sp, df in all_parts:
-        _save_parquet(df, RAW_DIR / args.dataset, sp)
+        out_path = split_dir(RAW_DIR / args.dataset, sp) / "part-0.parquet"
+        load_and_map(hf_path, mapper, sp, out_path, num_proc=num_proc)
 
     print("✅ done.")
 
@@ -1,6 +1,11 @@
 import argparse
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from src.utils.config import RAW_DIR
+from src.utils.parquet_io import split_dataset
+
+COUNT_COLS = ["title", "prompt", "solution", "difficulty", "tags"]
+SAMPLE_COLS = ["title", "prompt", "difficulty", "tags"]
 
 def main():
     ap = argparse.ArgumentParser()
@@ -9,16 +14,19 @@ def main():
     ap.add_argument("--n", type=int, default=3, help="rows to show")
     args = ap.parse_args()
 
-    path = RAW_DIR / args.dataset / f"{args.split}.parquet"
-    df = pd.read_parquet(path, engine="pyarrow")
-    print(f"📦 {args.dataset}/{args.split}: {len(df):,} rows, {len(df.columns)} cols")
-    print("🧾 columns:", list(df.columns))
-    for col in ["title", "prompt", "solution", "difficulty", "tags"]:
-        if col in df.columns:
-            nonempty = (df[col].astype(str).str.len() > 0).sum()
-            print(f"   non-empty {col}: {nonempty:,}")
+    # row count and column names come from the footers; only the columns we
+    # report on are read from disk
+    d = split_dataset(RAW_DIR / args.dataset, args.split)
+    names = d.schema.names
+    print(f"📦 {args.dataset}/{args.split}: {d.count_rows():,} rows, {len(names)} cols")
+    print("🧾 columns:", names)
+    tbl = d.to_table(columns=[c for c in COUNT_COLS if c in names])
+    for col in tbl.column_names:
+        nonempty = pc.sum(pc.greater(pc.utf8_length(tbl[col].cast(pa.string())), 0)).as_py() or 0
+        print(f"   non-empty {col}: {nonempty:,}")
     print("\n🔍 sample:")
-    print(df[["title","prompt","difficulty","tags"]].head(args.n).to_string(index=False))
+    sample = tbl.select([c for c in SAMPLE_COLS if c in tbl.column_names]).slice(0, args.n)
+    print(sample.to_pandas().to_string(index=False))
 
 if __name__ == "__main__":
     main()
@@ -1,44 +1,46 @@
 from __future__ import annotations
-import re
-from pathlib import Path
+import csv
 
-from pyspark.sql import SparkSession, functions as F, types as T
+from pyspark.sql import Column, SparkSession, functions as F
 from src.utils.config import CLEAN_DIR
 
 UNIFIED_COLS = ["source","dataset_id","title","prompt","solution","language","difficulty","tags","split"]
 
-# --- regex helpers ---
-RE_MULTI_WS = re.compile(r"\s+")
-RE_IMPORT_BLOCK = re.compile(
-    r"^(?:\s*(?:from\s+\w+(?:\.\w+)*\s+import\s+.*|import\s+[\w\.,\s\*]+)\s*\n)+",
-    re.MULTILINE,
-)
-RE_CODE_FENCE = re.compile(r"^```(?:\w+)?\s*|\s*```$", re.MULTILINE)
-
-def normalize_prompt(txt: str) -> str:
-    if not txt:
-        return ""
-    txt2 = RE_IMPORT_BLOCK.sub("", txt)
-    txt2 = RE_CODE_FENCE.sub("", txt2)
-    txt2 = RE_MULTI_WS.sub(" ", txt2).strip()
-    return txt2
-
-normalize_prompt_udf = F.udf(normalize_prompt, T.StringType())
+# --- regex helpers (Java regex syntax, evaluated natively by Spark) ---
+# (?U) = UNICODE_CHARACTER_CLASS: \s and \w match Unicode like the old
+# Python patterns did, instead of Java's ASCII-only default
+RE_MULTI_WS = r"(?U)\s+"
+RE_IMPORT_BLOCK = r"(?mU)^(?:\s*(?:from\s+\w+(?:\.\w+)*\s+import\s+.*|import\s+[\w\.,\s\*]+)\s*\n)+"
+RE_CODE_FENCE = r"(?mU)^```(?:\w+)?\s*|\s*```$"
+
+def normalize_prompt(col: Column) -> Column:
+    # strip import blocks and code fences, then collapse whitespace.
+    # Most prompts contain neither, so a literal substring check gates each
+    # backtracking regex and the common case skips it entirely.
+    txt = F.when(col.contains("import"), F.regexp_replace(col, RE_IMPORT_BLOCK, "")).otherwise(col)
+    txt = F.when(txt.contains("```"), F.regexp_replace(txt, RE_CODE_FENCE, "")).otherwise(txt)
+    return F.trim(F.regexp_replace(txt, RE_MULTI_WS, " "))
 
 def main():
     # simpler one-liner to avoid linter false-positives
     spark = SparkSession.builder.appName("spark_clean_unified").getOrCreate()  # type: ignore[attr-defined]
 
 
-    # 1) Read all cleaned parquet files
-    glob_path = str((CLEAN_DIR / "*" / "*.parquet").resolve())
+    # 1) Read all cleaned parquet files (<dataset_key>/*.parquet, listed once
+    #    here; Spark gets the concrete paths so it does not glob the tree again)
+    paths = sorted(str(p.resolve()) for p in CLEAN_DIR.glob("*/*.parquet"))
     # quick guard if nothing to read
-    if not list((CLEAN_DIR).glob("*/*.parquet")):
-        print(f"[spark] no cleaned parquet files at {glob_path}")
+    if not paths:
+        print(f"[spark] no cleaned parquet files at {(CLEAN_DIR / '*' / '*.parquet').resolve()}")
         spark.stop()
         return
 
-    df = spark.read.parquet(glob_path)
+    df = (
+        spark.read
+        .option("mergeSchema", "false")
+        .option("recursiveFileLookup", "false")
+        .parquet(*paths)
+    )
 
     # 2) Ensure consistent schema/cols
     for c in UNIFIED_COLS:
@@ -47,15 +49,12 @@ def main():
     df = df.select(*UNIFIED_COLS)
 
     # 3) Heavier prompt normalization
-    df = df.withColumn("prompt", normalize_prompt_udf(F.col("prompt"))) \
+    df = df.withColumn("prompt", normalize_prompt(F.col("prompt"))) \
            .where(F.length("prompt") >= 20) \
            .where(~F.col("prompt").rlike(r"^\s*$"))
 
-    # 4) Global dedupe across datasets (hash of source|title|prompt)
-    df = df.withColumn(
-        "hash_key",
-        F.sha2(F.concat_ws("||", "source", "title", "prompt"), 256)
-    ).dropDuplicates(["hash_key"]).drop("hash_key")
+    # 4) Global dedupe across datasets on (source, title, prompt)
+    df = df.dropDuplicates(["source", "title", "prompt"])
 
     # 5) Stats
     stats = df.agg(
@@ -68,12 +67,21 @@ def main():
     # 6) Write unioned dataset partitioned by source
     out_dir = (CLEAN_DIR / "_union").resolve()
     out_dir.mkdir(parents=True, exist_ok=True)
-    df.repartition(1, "source").write.mode("overwrite").partitionBy("source").parquet(str(out_dir))
+    # one shuffle partition per source so sources are written concurrently
+    n_parts = max(int(stats["sources"]), 1)
+    df.repartition(n_parts, F.col("source")).write.mode("overwrite") \
+        .option("compression", "zstd") \
+        .option("maxRecordsPerFile", 500_000) \
+        .partitionBy("source").parquet(str(out_dir))
     print(f"✅ Spark union saved -> {out_dir}")
 
     # 7) Tiny sample for eyeballing
     sample_csv = out_dir / "sample_50.csv"
-    df.limit(50).toPandas().to_csv(sample_csv, index=False)
+    rows = df.limit(50).collect()
+    with sample_csv.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(df.columns)
+        w.writerows(rows)
     print(f"👀 sample -> {sample_csv}")
 
     spark.stop()
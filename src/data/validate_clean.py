@@ -1,109 +1,193 @@
 import argparse
-import hashlib
-from pathlib import Path
-from typing import Dict, Tuple
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from src.utils.config import RAW_DIR, CLEAN_DIR
-from src.schemas.columns import UNIFIED_CODE_COLUMNS
+from src.utils.parquet_io import PARQUET_WRITE_OPTIONS, ROW_GROUP_SIZE, split_dataset, split_dir
+from src.schemas.columns import UNIFIED_CODE_COLUMNS, UNIFIED_ARROW_SCHEMA
 
 # Required text columns for a usable row
 REQ_TEXT_COLS = ["prompt"]
-
-
-def _read_parquet(in_path: Path) -> pd.DataFrame:
-    df = pd.read_parquet(in_path, engine="pyarrow")
-    # Ensure unified columns exist & are ordered
-    for col in UNIFIED_CODE_COLUMNS.keys():
-        if col not in df.columns:
-            df[col] = ""
-    return df[list(UNIFIED_CODE_COLUMNS.keys())]
-
-
-def _normalize_strings(df: pd.DataFrame) -> pd.DataFrame:
-    obj_cols = df.select_dtypes(include=["object"]).columns
-    for c in obj_cols:
-        s = df[c].astype(str)
+# String columns, known statically from the unified schema
+STR_COLS = [c for c, t in UNIFIED_CODE_COLUMNS.items() if t is str]
+# Columns identifying a duplicate row
+DEDUP_KEY_COLS = ["source", "title", "prompt"]
+# Columns reported in the summary
+SUMMARY_COLS = ["prompt", "solution", "language", "difficulty", "tags"]
+# Rows per streamed batch; every cleaning step runs on one batch at a time
+BATCH_SIZE = 65_536
+
+# --- regex patterns (RE2 syntax, used by pyarrow.compute) ---
+# RE2's \s is ASCII-only; this class matches exactly what Python's str \s does
+_SPACE = r"[\s\p{Z}\x0b\x1c-\x1f\x85]"
+_WS = _SPACE + "+"
+_COMMA = _SPACE + "*," + _SPACE + "*"
+
+
+def _iter_batches(dataset_key: str, split: str) -> Iterator[pa.Table]:
+    # Stream only the unified columns present in the split's files
+    d = split_dataset(RAW_DIR / dataset_key, split)
+    present = [c for c in UNIFIED_CODE_COLUMNS.keys() if c in d.schema.names]
+    for batch in d.to_batches(columns=present, batch_size=BATCH_SIZE):
+        tbl = pa.Table.from_batches([batch])
+        # Ensure unified columns exist & are ordered (missing ones become
+        # nulls, filled with "" by _normalize_strings)
+        for col in UNIFIED_CODE_COLUMNS.keys():
+            if col not in present:
+                tbl = tbl.append_column(col, pa.nulls(tbl.num_rows, pa.string()))
+        yield tbl.select(list(UNIFIED_CODE_COLUMNS.keys()))
+
+
+def _hash64(*cols) -> np.ndarray:
+    # One vectorized 64-bit hash per row over the joined columns
+    joined = pc.binary_join_element_wise(*cols, "\x1f")
+    return pd.util.hash_array(joined.to_numpy(zero_copy_only=False))
+
+
+class HashSet64:
+    """Set of uint64 row hashes kept as sorted runs whose sizes at least double
+    from newest to oldest, so there are O(log N) runs and each key is re-merged
+    O(log N) times. Inserts cost O(B log N) amortized per batch of B keys, not
+    the O(N) of inserting into one sorted array. Memory is 8 bytes/entry plus a
+    transient copy of the largest run while it merges (a Python set of ints
+    costs ~70 bytes/entry)."""
+
+    def __init__(self):
+        self._runs: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+    def add(self, keys: np.ndarray) -> np.ndarray:
+        """Insert keys; returns a mask marking the first occurrence of each key not seen before."""
+        uniq, first = np.unique(keys, return_index=True)
+        seen = np.zeros(len(uniq), dtype=bool)
+        for run in self._runs:
+            pos = np.searchsorted(run, uniq)
+            hit = pos < len(run)
+            hit[hit] = run[pos[hit]] == uniq[hit]
+            seen |= hit
+        new = uniq[~seen]
+        if len(new):
+            self._runs.append(new)
+            while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+                newer = self._runs.pop()
+                # timsort detects the two sorted runs, so this is a linear merge
+                self._runs[-1] = np.sort(np.concatenate((self._runs[-1], newer)), kind="stable")
+        mask = np.zeros(len(keys), dtype=bool)
+        mask[first[~seen]] = True
+        return mask
+
+
+def _set(tbl: pa.Table, name: str, arr) -> pa.Table:
+    return tbl.set_column(tbl.schema.get_field_index(name), name, arr)
+
+
+def _normalize_strings(tbl: pa.Table) -> pa.Table:
+    for c in STR_COLS:
+        s = pc.fill_null(tbl.column(c).cast(pa.string()), "")
         # collapse whitespace to single spaces and strip
-        s = s.str.replace(r"\s+", " ", regex=True).str.strip()
+        s = pc.utf8_trim_whitespace(pc.replace_substring_regex(s, _WS, " "))
         # remove literal "None"
-        df[c] = s.where(s.ne("None"), "")
+        tbl = _set(tbl, c, pc.if_else(pc.equal(s, "None"), "", s))
     # normalize tags
-    if "tags" in df.columns:
-        df["tags"] = (
-            df["tags"]
-            .astype(str)
-            .str.replace(r"\s*,\s*", ",", regex=True)
-            .str.strip(", ")
-            .str.lower()
-        )
+    if "tags" in tbl.column_names:
+        s = pc.replace_substring_regex(tbl.column("tags"), _COMMA, ",")
+        s = pc.utf8_trim(s, characters=" ,")
+        tbl = _set(tbl, "tags", pc.utf8_lower(s))
     # normalize difficulty
-    if "difficulty" in df.columns:
-        df["difficulty"] = df["difficulty"].astype(str).str.lower()
-    return df
-
-
-def _drop_empties(df: pd.DataFrame, require_solution: bool = False) -> pd.DataFrame:
-    mask = pd.Series(True, index=df.index)
-    for c in REQ_TEXT_COLS:
-        if c in df.columns:
-            mask &= df[c].astype(str).str.len() > 0
-    if require_solution and "solution" in df.columns:
-        mask &= df["solution"].astype(str).str.len() > 0
-    return df.loc[mask].copy()
-
-
-def _dedupe(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
-    # Stable hash on (source, title, prompt)
-    def _row_key(row) -> str:
-        h = hashlib.sha256()
-        for k in ("source", "title", "prompt"):
-            h.update(str(row.get(k, "")).encode("utf-8"))
-        return h.hexdigest()
-
-    keys = df.apply(_row_key, axis=1)
-    before = len(df)
-    kept = ~keys.duplicated()
-    df = df.loc[kept].copy()
-    return df, (before - len(df))
-
-
-def _summary(df: pd.DataFrame) -> Dict[str, str]:
-    out: Dict[str, str] = {"rows": f"{len(df):,}"}
-    for c in ["prompt", "solution", "language", "difficulty", "tags"]:
-        if c in df.columns:
-            out[f"null_{c}"] = str(int(df[c].isna().sum()))
-            out[f"empty_{c}"] = str(int((df[c].astype(str).str.len() == 0).sum()))
-    if "title" in df.columns:
-        out["unique_titles"] = str(df["title"].nunique())
+    if "difficulty" in tbl.column_names:
+        tbl = _set(tbl, "difficulty", pc.utf8_lower(tbl.column("difficulty")))
+    return tbl
+
+
+def _drop_empties(tbl: pa.Table, require_solution: bool = False) -> pa.Table:
+    # columns are already normalized strings, so no cast is needed
+    cols = [c for c in REQ_TEXT_COLS if c in tbl.column_names]
+    if require_solution and "solution" in tbl.column_names:
+        cols.append("solution")
+    mask = None
+    for c in cols:
+        nonempty = pc.greater(pc.utf8_length(tbl.column(c)), 0)
+        mask = nonempty if mask is None else pc.and_(mask, nonempty)
+    return tbl if mask is None else tbl.filter(mask)
+
+
+def _dedupe(tbl: pa.Table, seen: HashSet64) -> Tuple[pa.Table, int]:
+    # Hash of (source, title, prompt), checked against every earlier batch;
+    # the dedup is non-adversarial so a non-cryptographic hash is enough
+    kept = seen.add(_hash64(*(tbl.column(k) for k in DEDUP_KEY_COLS)))
+    before = tbl.num_rows
+    tbl = tbl.filter(kept)
+    return tbl, (before - tbl.num_rows)
+
+
+def _accumulate(counts: Counter, titles: HashSet64, tbl: pa.Table) -> None:
+    counts["rows"] += tbl.num_rows
+    for c in SUMMARY_COLS:
+        col = tbl.column(c)
+        counts[f"null_{c}"] += col.null_count
+        counts[f"empty_{c}"] += pc.sum(pc.equal(col, "")).as_py() or 0
+    titles.add(_hash64(tbl.column("title")))
+
+
+def _summary(counts: Counter, titles: HashSet64) -> Dict[str, str]:
+    out: Dict[str, str] = {"rows": f"{counts['rows']:,}"}
+    for c in SUMMARY_COLS:
+        out[f"null_{c}"] = str(counts[f"null_{c}"])
+        out[f"empty_{c}"] = str(counts[f"empty_{c}"])
+    out["unique_titles"] = str(len(titles))
     return out
 
 
 def clean_one(dataset_key: str, split: str, require_solution: bool = False) -> None:
-    in_path = RAW_DIR / dataset_key / f"{split}.parquet"
-    if not in_path.exists():
-        raise FileNotFoundError(f"Missing input file: {in_path}")
-
-    print(f"🔎 Loading {in_path}")
-    df = _read_parquet(in_path)
-
-    print("🧹 Normalizing strings/tags/difficulty…")
-    df = _normalize_strings(df)
-
-    print("🚫 Dropping empty required fields…")
-    df = _drop_empties(df, require_solution=require_solution)
-
-    print("🧬 Deduplicating…")
-    df, removed = _dedupe(df)
-    print(f"   dedup removed: {removed}")
-
-    stats = _summary(df)
-    print("📊 Summary:", stats)
+    in_dir = split_dir(RAW_DIR / dataset_key, split)
+    if not in_dir.exists():
+        raise FileNotFoundError(f"Missing input partition: {in_dir}")
 
     out_dir = CLEAN_DIR / dataset_key
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{split}.parquet"
-    df.to_parquet(out_path, index=False, engine="pyarrow")
+    tmp_path = out_path.with_name(f".{out_path.name}.tmp")
+
+    print(f"🔎 Streaming {in_dir}")
+    print("🧹 Normalizing / dropping empties / deduplicating per batch…")
+    seen = HashSet64()
+    titles = HashSet64()
+    counts: Counter = Counter()
+    dropped = removed = 0
+    pending: List[pa.Table] = []
+    pending_rows = 0
+    with pq.ParquetWriter(tmp_path, UNIFIED_ARROW_SCHEMA, **PARQUET_WRITE_OPTIONS) as writer:
+        for tbl in _iter_batches(dataset_key, split):
+            n = tbl.num_rows
+            tbl = _drop_empties(_normalize_strings(tbl), require_solution=require_solution)
+            dropped += n - tbl.num_rows
+            tbl, r = _dedupe(tbl, seen)
+            removed += r
+            if tbl.num_rows:
+                _accumulate(counts, titles, tbl)
+                pending.append(tbl.cast(UNIFIED_ARROW_SCHEMA))
+                pending_rows += tbl.num_rows
+            # filtered batches are small; write only full ROW_GROUP_SIZE groups
+            if pending_rows >= ROW_GROUP_SIZE:
+                buf = pa.concat_tables(pending)
+                full = pending_rows - pending_rows % ROW_GROUP_SIZE
+                writer.write_table(buf.slice(0, full), row_group_size=ROW_GROUP_SIZE)
+                pending, pending_rows = [buf.slice(full)], pending_rows - full
+        if pending_rows:
+            writer.write_table(pa.concat_tables(pending), row_group_size=ROW_GROUP_SIZE)
+    tmp_path.replace(out_path)
+    print(f"   empty rows dropped: {dropped}")
+    print(f"   dedup removed: {removed}")
+
+    stats = _summary(counts, titles)
+    print("📊 Summary:", stats)
     print(f"✅ Clean saved -> {out_path}")
 
 
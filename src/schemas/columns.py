@@ -1,3 +1,5 @@
+import pyarrow as pa
+
 UNIFIED_CODE_COLUMNS = {
     "source": str,         # dataset name (e.g., 'LeetCodeDataset')
     "dataset_id": str,     # id inside the dataset if available
@@ -9,3 +11,6 @@ UNIFIED_CODE_COLUMNS = {
     "tags": str,           # comma-joined tags
     "split": str           # 'train','test','validation' if applicable
 }
+
+# Arrow schema for the unified parquet files (every unified column is a string)
+UNIFIED_ARROW_SCHEMA = pa.schema([(name, pa.string()) for name in UNIFIED_CODE_COLUMNS])
@@ -0,0 +1,31 @@
+# Shared parquet layout and write settings for the unified datasets.
+from pathlib import Path
+
+import pyarrow.dataset as ds
+
+# low-cardinality columns where dictionary + RLE encoding pays off
+DICTIONARY_COLUMNS = ["source", "language", "difficulty", "split"]
+
+# rows per row group for whole-table writes (larger groups = better scans;
+# per-group min/max statistics let readers skip groups)
+ROW_GROUP_SIZE = 128_000
+
+# kwargs accepted by both pq.write_table and pq.ParquetWriter
+PARQUET_WRITE_OPTIONS = dict(
+    compression="zstd",
+    compression_level=3,
+    use_dictionary=DICTIONARY_COLUMNS,
+    data_page_size=1 << 20,
+    write_statistics=True,
+)
+
+
+# Raw datasets are Hive-partitioned by split:
+#   raw/<dataset>/split=<split>/part-0.parquet
+# so split-scoped readers only touch that split's directory.
+def split_dir(root: Path, split: str) -> Path:
+    return root / f"split={split}"
+
+
+def split_dataset(root: Path, split: str) -> ds.Dataset:
+    return ds.dataset(split_dir(root, split), format="parquet")
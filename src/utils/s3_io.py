@@ -1,10 +1,17 @@
 import argparse
+import functools
+import mimetypes
+import mmap
 import os
-import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Iterable, Tuple
+from typing import Dict, Optional, Iterable, Tuple
 
+import blake3
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 
@@ -19,18 +26,50 @@ AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 S3_BUCKET = os.getenv("S3_BUCKET")
 S3_PREFIX = os.getenv("S3_PREFIX", "").strip("/")
 
+# object metadata key holding the BLAKE3 digest (sent as x-amz-meta-blake3)
+HASH_META_KEY = "blake3"
+
+# parallel PUTs across files; multipart PUTs within large files
+SYNC_WORKERS = 16
+UPLOAD_CONCURRENCY = 8  # multipart threads per file at the default worker count
+# every upload thread needs its own pooled connection
+MAX_POOL_CONNECTIONS = SYNC_WORKERS * UPLOAD_CONCURRENCY
+# sync_dir lists the remote prefix only when the local tree has more files
+# than this; smaller trees are checked with per-object HEAD requests
+HEAD_PROBE_MAX_FILES = 100
+# connection pool shared by the upload workers and their multipart threads
+CLIENT_CONFIG = BotoConfig(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    tcp_keepalive=True,
+)
+
+
+def _transfer_config(workers: int = 1) -> TransferConfig:
+    # split the connection pool across concurrent files so that
+    # workers * max_concurrency never exceeds MAX_POOL_CONNECTIONS
+    concurrency = max(1, min(UPLOAD_CONCURRENCY, MAX_POOL_CONNECTIONS // max(workers, 1)))
+    return TransferConfig(
+        multipart_chunksize=16 * 1024 * 1024,
+        max_concurrency=concurrency,
+        use_threads=True,
+    )
+
 
+@functools.lru_cache(maxsize=1)
 def _client():
+    # one session/client per process: credentials are resolved once and the
+    # HTTPS connection pool is shared by every call and upload thread
     if not (AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and S3_BUCKET):
         raise RuntimeError(
             "Missing AWS env vars. Set AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, S3_BUCKET in .env"
         )
-    return boto3.client(
-        "s3",
+    session = boto3.Session(
         region_name=AWS_REGION,
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
     )
+    return session.client("s3", config=CLIENT_CONFIG)
 
 
 def _key_for(local_path: Path, base_prefix: Optional[str] = None) -> str:
@@ -40,13 +79,85 @@ def _key_for(local_path: Path, base_prefix: Optional[str] = None) -> str:
 
 
 def _hash_file(p: Path) -> str:
-    h = hashlib.sha256()
+    h = blake3.blake3(max_threads=blake3.blake3.AUTO)
     with p.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
+        if os.fstat(f.fileno()).st_size:  # mmap rejects empty files
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
     return h.hexdigest()
 
 
+def _remote_meta(s3, key: str) -> Optional[Tuple[int, Optional[str]]]:
+    """(size, BLAKE3 digest or None) of the remote object, or None if it does not exist."""
+    try:
+        resp = s3.head_object(Bucket=S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return resp["ContentLength"], resp.get("Metadata", {}).get(HASH_META_KEY)
+
+
+def _extra_args(p: Path, digest: str) -> dict:
+    content_type, _ = mimetypes.guess_type(p.name)
+    return {
+        "ContentType": content_type or "application/octet-stream",
+        "ChecksumAlgorithm": "CRC32",
+        "Metadata": {HASH_META_KEY: digest},
+    }
+
+
+def _put(
+    s3, local_path: Path, key: str, digest: Optional[str] = None, config: Optional[TransferConfig] = None
+) -> None:
+    extra = _extra_args(local_path, digest or _hash_file(local_path))
+    s3.upload_file(str(local_path), S3_BUCKET, key, ExtraArgs=extra, Config=config or _transfer_config())
+
+
+_PRINT_LOCK = threading.Lock()
+
+
+def _log(msg: str) -> None:
+    # keep lines from concurrent workers from interleaving
+    with _PRINT_LOCK:
+        print(msg)
+
+
+def _sync_one(
+    s3,
+    p: Path,
+    key: str,
+    only_changed: bool,
+    remote_index: Optional[Dict[str, int]],
+    dry_run: bool,
+    config: TransferConfig,
+) -> bool:
+    """
+    Upload p to key unless the remote copy has the same content. Returns True if uploaded.
+    remote_index=None means the prefix was not listed and the object is probed with HEAD.
+    """
+    size = p.stat().st_size
+    digest = None
+    if only_changed and (remote_index is None or remote_index.get(key) == size):
+        meta = _remote_meta(s3, key)
+        if meta is not None and meta[0] == size:
+            remote_digest = meta[1]
+            if remote_digest is None:
+                # uploaded before content hashes were recorded
+                _log(f"↪︎ skip (same size) {key}")
+                return False
+            digest = _hash_file(p)
+            if remote_digest == digest:
+                _log(f"↪︎ skip (same hash) {key}")
+                return False
+    msg = f"⬆︎ {p} → s3://{S3_BUCKET}/{key}"
+    _log(("DRY-RUN " if dry_run else "") + msg)
+    if dry_run:
+        return False
+    _put(s3, p, key, digest, config)
+    return True
+
+
 # ---- single-file ops ----
 def upload_file(local_path: Path, key: Optional[str] = None) -> str:
     s3 = _client()
@@ -55,7 +166,7 @@ def upload_file(local_path: Path, key: Optional[str] = None) -> str:
         raise FileNotFoundError(local_path)
     obj_key = key or _key_for(local_path)
     print(f"⬆️  Upload {local_path} → s3://{S3_BUCKET}/{obj_key}")
-    s3.upload_file(str(local_path), S3_BUCKET, obj_key)
+    _put(s3, local_path, obj_key)
     return obj_key
 
 
@@ -84,11 +195,20 @@ def list_prefix(prefix: str) -> Iterable[Tuple[str, int]]:
 
 
 # ---- folder sync (up) ----
-def sync_dir(local_dir: Path, prefix: Optional[str] = None, dry_run: bool = False, only_changed: bool = True):
+def sync_dir(
+    local_dir: Path,
+    prefix: Optional[str] = None,
+    dry_run: bool = False,
+    only_changed: bool = True,
+    max_workers: int = SYNC_WORKERS,
+):
     """
     Upload a local directory tree to S3.
     - prefix: override S3_PREFIX for this sync (appended with the local relative paths).
-    - only_changed: skip upload if remote size matches.
+    - only_changed: skip upload if remote size and BLAKE3 hash match
+      (size only for objects uploaded without a hash).
+    - max_workers: number of files uploaded concurrently (per-file multipart
+      concurrency shrinks so the total stays within the connection pool).
     """
     _client()  # validate creds early
     local_dir = local_dir.resolve()
@@ -98,23 +218,24 @@ def sync_dir(local_dir: Path, prefix: Optional[str] = None, dry_run: bool = Fals
     base_prefix = prefix.strip("/") if prefix else S3_PREFIX
     print(f"🔁 Sync {local_dir} → s3://{S3_BUCKET}/{base_prefix or ''}")
 
-    remote_index = {k: sz for k, sz in list_prefix(base_prefix)} if only_changed else {}
+    jobs = [(p, _key_for(p, base_prefix)) for p in local_dir.rglob("*") if p.is_file()]
+
+    # Small local trees: HEAD each object in parallel instead of paging
+    # through the whole remote prefix
+    remote_index = None
+    if only_changed and len(jobs) > HEAD_PROBE_MAX_FILES:
+        remote_index = {k: sz for k, sz in list_prefix(base_prefix)}
 
     s3 = _client()
+    config = _transfer_config(max_workers)
     uploaded = 0
-    for p in local_dir.rglob("*"):
-        if not p.is_file():
-            continue
-        key = _key_for(p, base_prefix)
-        size = p.stat().st_size
-        if only_changed and remote_index.get(key) == size:
-            print(f"↪︎ skip (same size) {key}")
-            continue
-        msg = f"⬆︎ {p} → s3://{S3_BUCKET}/{key}"
-        print(("DRY-RUN " if dry_run else "") + msg)
-        if not dry_run:
-            s3.upload_file(str(p), S3_BUCKET, key)
-            uploaded += 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(_sync_one, s3, p, key, only_changed, remote_index, dry_run, config)
+            for p, key in jobs
+        ]
+        for fut in as_completed(futures):
+            uploaded += fut.result()
 
     print(f"✅ Sync complete. Uploaded {uploaded} file(s).")
 
@@ -170,6 +291,8 @@ def main():
     sync.add_argument("--prefix", default=None)
     sync.add_argument("--dry-run", action="store_true")
     sync.add_argument("--no-only-changed", action="store_true")
+    sync.add_argument("--workers", type=int, default=SYNC_WORKERS,
+                      help="Concurrent file uploads (default: %(default)s)")
 
     downsync = sub.add_parser("sync-down")
     downsync.add_argument("prefix", help="S3 prefix to download (e.g., education_agent/data/clean/_union)")
@@ -196,6 +319,7 @@ def main():
             prefix=args.prefix,
             dry_run=args.dry_run,
             only_changed=not args.no_only_changed,
+            max_workers=args.workers,
         )
 
     elif args.cmd == "sync-down":